@@ -1,18 +1,23 @@
 import os
+import re
+import sys
 import time
-import hmac
-import hashlib
+import heapq
 import logging
 import aiohttp
 import asyncio
-import random
+import orjson
 from dotenv import load_dotenv
 from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, ContextTypes, CommandHandler, CallbackQueryHandler
+from telegram.error import RetryAfter
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 import uvicorn
 from datetime import datetime, timedelta
+from collections import Counter, OrderedDict, deque
+from itertools import takewhile
+from functools import wraps
 import html
 
 # ====================== НАСТРОЙКИ ======================
@@ -23,12 +28,23 @@ MY_USER_ID = int(os.getenv("MY_USER_ID", 0))
 
 MEXC_API_KEY = os.getenv("MEXC_API_KEY", "")
 MEXC_SECRET_KEY = os.getenv("MEXC_SECRET_KEY", "")
+MEXC_WS_URL = "wss://contract.mexc.com/edge"
+MEXC_TIMEOUT = aiohttp.ClientTimeout(total=10)          # Свечи и тикеры
+MEXC_DETAIL_TIMEOUT = aiohttp.ClientTimeout(total=15)   # Список контрактов (большой ответ)
 
 DAILY_VOLUME_LIMIT = 500_000
 MIN_PREV_VOLUME = 1000      # Объем за предыдущие 5 минут
 MIN_CURRENT_VOLUME = 4000   # Объем за текущие 5 минут
 MIN_PRICE = 0.0001
 MAX_PRICE = 100
+SCAN_INTERVAL = 50          # Период сканирования, секунд
+SCAN_CONCURRENCY = 32       # Одновременных запросов к MEXC в сканере
+MEXC_RATE_LIMIT = 20        # Запросов к MEXC за MEXC_RATE_PERIOD секунд
+MEXC_RATE_PERIOD = 2
+MEXC_MAX_RETRIES = 4        # Повторов запроса после 429/418
+ALERT_SEND_INTERVAL = 1.1   # Пауза между алертами (Telegram: ~1 сообщение в секунду в чат)
+TRACKED_CACHE_PATH = os.getenv("TRACKED_CACHE_PATH", "/tmp/mexc_tracked_symbols.json")
+TRACKED_CACHE_TTL = 8 * 3600  # Кэш отфильтрованных пар моложе 8 часов используется при старте
 
 logging.basicConfig(
     level=logging.INFO,
@@ -38,246 +54,349 @@ logger = logging.getLogger(__name__)
 
 # Глобальные переменные
 tracked_symbols = set()
-sent_alerts = {}
+sent_alerts = OrderedDict()  # alert_id -> время, в порядке отправки
 blacklist = set()
 paused_alerts = set()
-alert_history = []
+alert_history = deque(maxlen=1000)  # Храним только последние 1000 алертов
+prev_candles = {}  # symbol -> (начало текущей 5m свечи, объём и закрытие предыдущей)
+ws_klines = {}     # symbol -> (начало текущей 5m свечи, объём, закрытие) из WebSocket
+scanned_volumes = {}  # symbol -> (подтверждённый объём 24ч, объём 24ч последнего успешного скана свечей)
+api_symbols = {}   # BTCUSDT -> BTC_USDT, заполняется при загрузке контрактов
+contract_symbols = {}  # BTC_USDT -> BTCUSDT, обратное отображение для WebSocket
 
 # Глобальные переменные для управления задачами
 scanner_task = None
+kline_stream_task = None
+alert_sender_task = None
+symbols_refresh_task = None
+symbols_lock = asyncio.Lock()  # Одновременно идёт только одно обновление списка пар
 application = None
 bot_instance = None
+http_session = None
 
 # Списки для фильтрации
 STOCK_KEYWORDS = ['STOCK', 'ETF', 'SHARES', 'INDEX', 'FUND', 'BASKET', 'TOKENIZED']
-STOCK_SYMBOLS = {
+STOCK_SYMBOLS = frozenset({
     'AAPL', 'GOOGL', 'AMZN', 'MSFT', 'TSLA', 'META', 'NVDA', 'NFLX', 
     'AMD', 'INTC', 'IBM', 'ORCL', 'CSCO', 'ADBE', 'PYPL', 'CRM',
     'SPY', 'QQQ', 'DIA', 'IWM', 'VOO', 'IVV', 'VTI', 'VUG',
     'MSTR', 'COIN', 'RIOT', 'MAR', 'HUT', 'BITF', 'CLSK'
-}
+})
+# Все проверки на акции одним регулярным выражением - один проход по строке:
+# цифры (токенизированные акции), ключевые слова акций или известный тикер акции
+STOCK_SYMBOL_SEARCH = re.compile(
+    "|".join(
+        [r"\d"]
+        + [re.escape(keyword) for keyword in STOCK_KEYWORDS]
+        + [rf"^{re.escape(stock)}USDT$" for stock in sorted(STOCK_SYMBOLS)]
+    ),
+    re.IGNORECASE
+).search
+
+# Шаблон алерта (разбирается один раз при загрузке модуля)
+format_alert_message = (
+    "⚡ {title}: {symbol}\n"
+    "Объём за 5 мин: {prev_vol:,} → {curr_vol:,} USDT\n"
+    "Изменение: {volume_change_pct:+.0f}%\n"
+    "Цена: {price_change_pct:+.2f}%\n"
+    "https://www.mexc.com/futures/{contract}"
+).format
+
+# Постоянные части текстов: значения фильтров известны при загрузке модуля
+FILTERS_TEXT = (
+    "Фильтры:\n"
+    f"• 1D объём < {DAILY_VOLUME_LIMIT:,} USDT\n"
+    f"• Пред. 5 мин < {MIN_PREV_VOLUME} USDT\n"
+    f"• Тек. 5 мин > {MIN_CURRENT_VOLUME} USDT\n"
+    f"• Цена: {MIN_PRICE:.4f} - {MAX_PRICE:.2f} USDT\n"
+)
+MAIN_MENU_HEADER = "📊 MEXC 5-MIN Volume Scanner\n\nСтатус: ✅ Активен\n"
+MAIN_MENU_FOOTER = FILTERS_TEXT + "\nВыберите действие:"
+
+# Клавиатуры меню не меняются - собираем их один раз
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📋 Список пар", callback_data="list_symbols")],
+    [InlineKeyboardButton("🚫 Блэк-лист", callback_data="blacklist_menu")],
+    [InlineKeyboardButton("🔕 Паузы", callback_data="paused_menu")],
+    [InlineKeyboardButton("📊 Статистика", callback_data="stats")],
+    [InlineKeyboardButton("🔄 Обновить", callback_data="refresh")]
+])
+BACK_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="back")]])
 
 # ====================== MEXC API ФУНКЦИИ ======================
-def generate_signature(params: str) -> str:
-    """Генерация подписи для MEXC API"""
-    return hmac.new(
-        MEXC_SECRET_KEY.encode() if MEXC_SECRET_KEY else b"",
-        params.encode(),
-        hashlib.sha256
-    ).hexdigest()
+class RateLimiter:
+    """Token bucket: не больше rate запросов за period секунд"""
+    
+    def __init__(self, rate: int, period: float):
+        self.rate = rate
+        self.period = period
+        self.tokens = rate
+        self.updated = None
+        self.lock = asyncio.Lock()
+    
+    async def __aenter__(self):
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.period)
+                self.updated = now
+                
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return self
+                
+                # Ждём ровно столько, сколько нужно до следующего токена
+                await asyncio.sleep((1 - self.tokens) * self.period / self.rate)
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+    
+    def pause(self, seconds: float):
+        """Не выдаём токены seconds секунд (биржа ответила 429/418)"""
+        # Отметка пополнения в будущем даёт отрицательный запас - __aenter__ дождётся её сам
+        resume_at = asyncio.get_running_loop().time() + seconds
+        self.tokens = 0
+        self.updated = max(self.updated or 0, resume_at)
+
+
+mexc_limiter = RateLimiter(MEXC_RATE_LIMIT, MEXC_RATE_PERIOD)
+
+
+def json_dumps(obj) -> str:
+    """Сериализация через orjson для aiohttp (он ждёт str, а не bytes)"""
+    return orjson.dumps(obj).decode()
+
+
+def retry_delay(resp, attempt: int) -> float:
+    """Пауза перед повтором: Retry-After от биржи или 1, 2, 4... секунд, не больше 30"""
+    try:
+        return min(float(resp.headers.get("Retry-After")), 30)
+    except (TypeError, ValueError):
+        return min(2 ** attempt, 30)
+
+
+async def mexc_get(url: str, params: dict = None, timeout=MEXC_TIMEOUT):
+    """GET к MEXC через лимитер с повтором при 429/418. Возвращает (статус, JSON или None)"""
+    for attempt in range(MEXC_MAX_RETRIES + 1):
+        async with mexc_limiter, http_session.get(url, params=params, timeout=timeout) as resp:
+            if resp.status in (418, 429) and attempt < MEXC_MAX_RETRIES:
+                delay = retry_delay(resp, attempt)
+                logger.warning("MEXC ограничил запросы (%s), пауза %.0f сек", resp.status, delay)
+                mexc_limiter.pause(delay)
+                continue
+            
+            if resp.status != 200:
+                return resp.status, None
+            
+            # aiohttp сам отправляет Accept-Encoding: gzip, deflate и распаковывает ответ
+            logger.debug("%s: Content-Encoding=%s", url, resp.headers.get('Content-Encoding'))
+            return resp.status, orjson.loads(await resp.read())
+
+
+def to_api_symbol(symbol: str) -> str:
+    """Имя контракта MEXC для символа (BTCUSDT -> BTC_USDT)"""
+    return api_symbols.get(symbol) or symbol.replace("USDT", "_USDT")
 
 
 async def get_all_futures_symbols():
     """Получаем ВСЕ символы фьючерсов с MEXC"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                "https://contract.mexc.com/api/v1/contract/detail",
-                timeout=15
-            ) as resp:
-                if resp.status != 200:
-                    logger.error(f"Ошибка получения символов: {resp.status}")
-                    return []
-                
-                data = await resp.json()
-                if not data.get("success"):
-                    logger.error(f"API error: {data}")
-                    return []
-                
-                symbols_data = data.get("data", [])
-                all_symbols = []
-                
-                for s in symbols_data:
-                    symbol_name = s.get("symbol", "")
-                    if symbol_name.endswith("_USDT"):
-                        formatted = symbol_name.replace("_USDT", "USDT")
-                        all_symbols.append(formatted)
-                
-                logger.info(f"Найдено {len(all_symbols)} USDT фьючерсов")
-                return all_symbols
-                
+        status, data = await mexc_get(
+            "https://contract.mexc.com/api/v1/contract/detail",
+            timeout=MEXC_DETAIL_TIMEOUT
+        )
+        if status != 200:
+            logger.error("Ошибка получения символов: %s", status)
+            return []
+        
+        if not data.get("success"):
+            logger.error("API error: %s", data)
+            return []
+        
+        symbols_data = data.get("data", [])
+        all_symbols = []
+        
+        for s in symbols_data:
+            symbol_name = s.get("symbol", "")
+            if symbol_name.endswith("_USDT"):
+                # Интернируем имена: ключи всех словарей по символу будут одним объектом
+                formatted = sys.intern(symbol_name.replace("_USDT", "USDT"))
+                symbol_name = sys.intern(symbol_name)
+                api_symbols[formatted] = symbol_name
+                contract_symbols[symbol_name] = formatted
+                all_symbols.append(formatted)
+        
+        logger.info("Найдено %s USDT фьючерсов", len(all_symbols))
+        return all_symbols
+        
     except Exception as e:
-        logger.error(f"Ошибка получения всех символов: {e}")
+        logger.error("Ошибка получения всех символов: %s", e)
         return []
 
 
-async def get_1d_volume(symbol: str) -> float:
-    """Получаем объём за 1 день (24 часа) для символа"""
-    api_symbol = symbol.replace("USDT", "_USDT")
-    timestamp = str(int(time.time() * 1000))
+async def get_kline(symbol: str, interval: str, limit: int):
+    """Получаем свечи символа (публичный эндпоинт, подпись не нужна)"""
+    api_symbol = to_api_symbol(symbol)
     
-    query_string = f"symbol={api_symbol}&interval=Day1&limit=1"
-    signature = generate_signature(query_string)
+    _, data = await mexc_get(
+        f"https://contract.mexc.com/api/v1/contract/kline/{api_symbol}",
+        params={
+            "symbol": api_symbol,
+            "interval": interval,
+            "limit": limit
+        }
+    )
     
-    headers = {
-        "ApiKey": MEXC_API_KEY if MEXC_API_KEY else "",
-        "Request-Time": timestamp,
-        "Signature": signature
-    }
+    if data and data.get("success") and "data" in data:
+        return data["data"]
     
+    return None
+
+
+async def get_all_tickers():
+    """Получаем тикеры всех контрактов одним запросом: symbol -> (объём 24ч в USDT, цена)"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"https://contract.mexc.com/api/v1/contract/kline/{api_symbol}",
-                params={
-                    "symbol": api_symbol,
-                    "interval": "Day1",
-                    "limit": 1
-                },
-                headers=headers,
-                timeout=10
-            ) as response:
-                
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("success") and "data" in data:
-                        kline_data = data["data"]
-                        if "amount" in kline_data and len(kline_data["amount"]) > 0:
-                            volume = float(kline_data["amount"][0])
-                            return volume
-                
-                return 0
-                
+        status, data = await mexc_get("https://contract.mexc.com/api/v1/contract/ticker")
+        if status != 200:
+            logger.error("Ошибка получения тикеров: %s", status)
+            return None
+        
+        if not data.get("success"):
+            logger.error("API error: %s", data)
+            return None
+        
+        return {
+            contract_symbols[t["symbol"]]: (t.get("amount24", 0), t.get("lastPrice", 0))
+            for t in data.get("data", [])
+            if t.get("symbol") in contract_symbols
+        }
+        
     except Exception as e:
-        logger.debug(f"Ошибка получения 1D объёма для {symbol}: {str(e)[:100]}")
-        return 0
+        logger.error("Ошибка получения тикеров: %s", e)
+        return None
 
 
-async def get_5m_kline_data(symbol: str):
-    """Получаем данные за последние 10 свечей на 5-минутном таймфрейме (50 минут)"""
-    api_symbol = symbol.replace("USDT", "_USDT")
-    timestamp = str(int(time.time() * 1000))
-    
-    query_string = f"symbol={api_symbol}&interval=Min5&limit=10"
-    signature = generate_signature(query_string)
-    
-    headers = {
-        "ApiKey": MEXC_API_KEY if MEXC_API_KEY else "",
-        "Request-Time": timestamp,
-        "Signature": signature
-    }
+async def get_1d_stats(symbol: str):
+    """Получаем объём за 1 день и текущую цену (закрытие дневной свечи) одним запросом"""
+    try:
+        kline_data = await get_kline(symbol, "Day1", 1)
+        if kline_data and len(kline_data.get("amount", [])) > 0:
+            return kline_data["amount"][-1], kline_data["close"][-1]
+        
+    except Exception as e:
+        logger.debug("Ошибка получения 1D объёма для %s: %.100s", symbol, e)
     
+    return 0, None
+
+
+async def get_5m_kline_data(symbol: str):
+    """Получаем текущую и предыдущую свечи на 5-минутном таймфрейме"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"https://contract.mexc.com/api/v1/contract/kline/{api_symbol}",
-                params={
-                    "symbol": api_symbol,
-                    "interval": "Min5",
-                    "limit": 10
-                },
-                headers=headers,
-                timeout=10
-            ) as response:
-                
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get("success") and "data" in data:
-                        kline_data = data["data"]
-                        
-                        if len(kline_data.get("close", [])) >= 2:
-                            # Суммируем объем за последние 5 минут (текущая свеча)
-                            curr_volume = int(float(kline_data["amount"][-1]))
-                            curr_close = float(kline_data["close"][-1])
-                            
-                            # Суммируем объем за предыдущие 5 минут (предыдущая свеча)
-                            prev_volume = int(float(kline_data["amount"][-2]))
-                            prev_close = float(kline_data["close"][-2])
-                            
-                            return {
-                                "prev_volume": prev_volume,
-                                "curr_volume": curr_volume,
-                                "prev_price": prev_close,
-                                "curr_price": curr_close,
-                                "symbol": symbol
-                            }
-                
+        # Предыдущая свеча уже закрыта - пока идёт та же 5-минутка, берём её из кэша
+        candle_start = int(time.time()) // 300 * 300
+        cached = prev_candles.get(symbol)
+        
+        # Текущая свеча приходит по WebSocket - если обе свечи известны, запрос не нужен
+        live = ws_klines.get(symbol)
+        if cached and cached[0] == candle_start and live and live[0] == candle_start:
+            _, prev_amount, prev_close = cached
+            _, curr_amount, curr_close = live
+            return {
+                "prev_volume": int(prev_amount),
+                "curr_volume": int(curr_amount),
+                "prev_price": prev_close,
+                "curr_price": curr_close,
+                "symbol": symbol
+            }
+        
+        limit = 1 if cached and cached[0] == candle_start else 2
+        
+        kline_data = await get_kline(symbol, "Min5", limit)
+        if not kline_data or not kline_data.get("close"):
+            return None
+        
+        candle_times = kline_data.get("time", [])
+        if len(kline_data["close"]) >= 2:
+            # Берём только две последние свечи: предыдущую и текущую
+            # MEXC отдаёт amount числами, int() отбрасывает дробную часть без float()
+            prev_amount, curr_amount = kline_data["amount"][-2:]
+            prev_close, curr_close = kline_data["close"][-2:]
+            if candle_times:
+                prev_candles[symbol] = (candle_times[-1], prev_amount, prev_close)
+        elif cached and candle_times and candle_times[-1] == cached[0]:
+            _, prev_amount, prev_close = cached
+            curr_amount = kline_data["amount"][-1]
+            curr_close = kline_data["close"][-1]
+        else:
+            # Свеча на бирже уже сменилась - при следующем запросе возьмём обе
+            prev_candles.pop(symbol, None)
+            return None
+        
+        return {
+            "prev_volume": int(prev_amount),
+            "curr_volume": int(curr_amount),
+            "prev_price": prev_close,
+            "curr_price": curr_close,
+            "symbol": symbol
+        }
+        
     except Exception as e:
-        logger.debug(f"Ошибка 5m данных для {symbol}: {str(e)[:100]}")
+        logger.debug("Ошибка 5m данных для %s: %.100s", symbol, e)
     
     return None
 
 
+def is_stock_symbol(symbol: str) -> bool:
+    """Известная акция, ключевое слово акций или цифры в имени (токенизированные акции)"""
+    return STOCK_SYMBOL_SEARCH(symbol) is not None
+
+
 def filter_stock_symbols(symbols: list) -> list:
     """Фильтруем акции и подобные символы"""
-    filtered = []
+    filtered = [symbol for symbol in symbols if not is_stock_symbol(symbol)]
     
-    for symbol in symbols:
-        clean_symbol = symbol.replace("USDT", "")
-        
-        # Пропускаем если это известная акция
-        if clean_symbol in STOCK_SYMBOLS:
-            logger.debug(f"Пропускаем известную акцию: {symbol}")
-            continue
-        
-        # Пропускаем если содержит ключевые слова акций
-        if any(keyword in symbol.upper() for keyword in STOCK_KEYWORDS):
-            logger.debug(f"Пропускаем символ с ключевым словом: {symbol}")
-            continue
-        
-        # Пропускаем если содержит цифры (например, токенизированные акции)
-        if any(char.isdigit() for char in clean_symbol):
-            logger.debug(f"Пропускаем символ с цифрами: {symbol}")
-            continue
-        
-        filtered.append(symbol)
+    if logger.isEnabledFor(logging.DEBUG):
+        skipped = set(symbols).difference(filtered)
+        logger.debug("Пропускаем акции и похожие символы: %s", ", ".join(sorted(skipped)))
     
-    logger.info(f"После фильтрации акций: {len(filtered)} из {len(symbols)}")
+    logger.info("После фильтрации акций: %s из %s", len(filtered), len(symbols))
     return filtered
 
 
-async def check_symbol_conditions(symbol: str) -> bool:
-    """Проверяем условия для символа"""
+async def check_symbol_conditions(symbol: str, tickers: dict = None) -> bool:
+    """Проверяем условия для символа (объём и цену берём из тикеров, если они есть)"""
     try:
+        # Акции, ключевые слова и цифры уже отсеял filter_stock_symbols
         # 1. Проверяем блэк-лист
         if symbol in blacklist:
-            logger.debug(f"Пропускаем {symbol}: в блэк-листе")
-            return False
-        
-        # 2. Проверяем что это не акция
-        clean_symbol = symbol.replace("USDT", "")
-        if clean_symbol in STOCK_SYMBOLS:
-            logger.debug(f"Пропускаем акцию: {symbol}")
+            logger.debug("Пропускаем %s: в блэк-листе", symbol)
             return False
         
-        # 3. Проверяем что нет ключевых слов акций
-        if any(keyword in symbol.upper() for keyword in STOCK_KEYWORDS):
-            logger.debug(f"Пропускаем символ с ключевым словом: {symbol}")
-            return False
-        
-        # 4. Проверяем что нет цифр в символе
-        if any(char.isdigit() for char in clean_symbol):
-            logger.debug(f"Пропускаем символ с цифрами: {symbol}")
-            return False
-        
-        # 5. Проверяем 1D объём
-        daily_volume = await get_1d_volume(symbol)
+        # 2. Проверяем 1D объём: из общего снимка тикеров, иначе по дневной свече
+        if tickers and symbol in tickers:
+            daily_volume, current_price = tickers[symbol]
+        else:
+            daily_volume, current_price = await get_1d_stats(symbol)
         if daily_volume > DAILY_VOLUME_LIMIT:
-            logger.debug(f"Пропускаем {symbol}: объём {daily_volume:,.0f} > {DAILY_VOLUME_LIMIT:,}")
+            logger.debug("Пропускаем %s: объём %.0f > %d", symbol, daily_volume, DAILY_VOLUME_LIMIT)
             return False
         
-        # 6. Проверяем цену токена
-        try:
-            data = await get_5m_kline_data(symbol)
-            if data:
-                current_price = data["curr_price"]
-                
-                # Фильтр по цене
-                if current_price < MIN_PRICE:
-                    logger.debug(f"Пропускаем {symbol}: цена слишком низкая {current_price:.8f}")
-                    return False
-                elif current_price > MAX_PRICE:
-                    logger.debug(f"Пропускаем {symbol}: цена слишком высокая {current_price:.4f}")
-                    return False
-        except Exception as e:
-            logger.debug(f"Ошибка проверки цены для {symbol}: {e}")
-            return False
+        # 3. Проверяем цену токена
+        if current_price is not None:
+            if current_price < MIN_PRICE:
+                logger.debug("Пропускаем %s: цена слишком низкая %.8f", symbol, current_price)
+                return False
+            elif current_price > MAX_PRICE:
+                logger.debug("Пропускаем %s: цена слишком высокая %.4f", symbol, current_price)
+                return False
         
-        logger.debug(f"✓ {symbol}: объём {daily_volume:,.0f}")
+        logger.debug("✓ %s: объём %.0f", symbol, daily_volume)
         return True
         
     except Exception as e:
-        logger.error(f"Ошибка проверки {symbol}: {e}")
+        logger.error("Ошибка проверки %s: %s", symbol, e)
         return False
 
 
@@ -286,88 +405,86 @@ async def load_and_filter_symbols():
     """Загружаем и фильтруем символы по всем условиям"""
     global tracked_symbols
     
-    logger.info("Начинаю загрузку и фильтрацию символов...")
+    # Обновление уже идёт (фоновое при старте, сканер или кнопка) - дожидаемся его
+    if symbols_lock.locked():
+        async with symbols_lock:
+            return bool(tracked_symbols)
     
-    try:
-        all_symbols = await get_all_futures_symbols()
-        if not all_symbols:
-            logger.error("Не удалось получить символы фьючерсов")
-            return False
-        
-        logger.info(f"Получено {len(all_symbols)} символов. Начинаю фильтрацию...")
-        
-        # 1. Фильтруем акции
-        filtered_symbols = filter_stock_symbols(all_symbols)
-        
-        # 2. Проверяем остальные условия для каждого символа
-        low_volume_symbols = []
-        total_symbols = len(filtered_symbols)
-        batch_size = 20
+    async with symbols_lock:
+        logger.info("Начинаю загрузку и фильтрацию символов...")
         
-        for i in range(0, total_symbols, batch_size):
-            batch = filtered_symbols[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            total_batches = (total_symbols + batch_size - 1) // batch_size
+        try:
+            all_symbols = await get_all_futures_symbols()
+            if not all_symbols:
+                logger.error("Не удалось получить символы фьючерсов")
+                return False
+            
+            logger.info("Получено %s символов. Начинаю фильтрацию...", len(all_symbols))
+            
+            # 1. Фильтруем акции
+            filtered_symbols = filter_stock_symbols(all_symbols)
+            
+            # 2. Объём за 24ч и цену всех пар берём одним запросом тикеров
+            tickers = await get_all_tickers()
+            
+            # 3. Проверяем остальные условия для всех символов параллельно.
+            # Запросы нужны только парам без тикера: их ограничивают семафор и mexc_limiter
+            semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
             
-            logger.info(f"Проверяю батч {batch_num}/{total_batches} ({len(batch)} символов)")
+            async def check(symbol):
+                async with semaphore:
+                    return await check_symbol_conditions(symbol, tickers)
             
-            tasks = []
-            for symbol in batch:
-                task = asyncio.create_task(check_symbol_conditions(symbol))
-                tasks.append((symbol, task))
+            results = await asyncio.gather(
+                *(check(symbol) for symbol in filtered_symbols),
+                return_exceptions=True
+            )
+            
+            low_volume_symbols = []
+            for symbol, result in zip(filtered_symbols, results):
+                if isinstance(result, Exception):
+                    logger.error("Ошибка проверки %s: %s", symbol, result)
+                elif result:
+                    low_volume_symbols.append(symbol)
+            
+            # Блэк-лист могли пополнить, пока шла проверка
+            tracked_symbols = set(low_volume_symbols) - blacklist
+            await save_tracked_symbols()
             
-            for symbol, task in tasks:
+            logger.info("✅ ФИЛЬТРАЦИЯ ЗАВЕРШЕНА!")
+            logger.info("   Всего символов: %s", len(all_symbols))
+            logger.info("   После фильтра акций: %s", len(filtered_symbols))
+            logger.info("   После всех фильтров: %s", len(tracked_symbols))
+            logger.info("   В блэк-листе: %s", len(blacklist))
+            
+            if tracked_symbols:
+                sample = list(tracked_symbols)[:15]
+                logger.info("   Примеры: %s", ', '.join(sample))
+                
+                # Отправляем уведомление без HTML
                 try:
-                    if await task:
-                        low_volume_symbols.append(symbol)
-                        
+                    if bot_instance:
+                        await bot_instance.send_message(
+                            chat_id=MY_USER_ID,
+                            text=f"✅ Сканер запущен\n\n"
+                                 f"Отслеживается: {len(tracked_symbols)} пар\n"
+                                 f"В блэк-листе: {len(blacklist)} монет\n"
+                                 f"Уведомления отключены: {len(paused_alerts)} монет\n\n"
+                                 f"{FILTERS_TEXT}"
+                                 f"• Исключены акции\n\n"
+                                 f"Примеры:\n{', '.join(sample[:8])}"
+                        )
+                        logger.info("✅ Стартовое сообщение отправлено")
+                    else:
+                        logger.error("❌ bot_instance не инициализирован для отправки стартового сообщения")
                 except Exception as e:
-                    logger.error(f"Ошибка проверки {symbol}: {e}")
+                    logger.error("❌ Не удалось отправить стартовое уведомление: %s", e)
             
-            # Пауза между батчами
-            if i + batch_size < total_symbols:
-                await asyncio.sleep(1)
-        
-        tracked_symbols = set(low_volume_symbols)
-        
-        logger.info(f"✅ ФИЛЬТРАЦИЯ ЗАВЕРШЕНА!")
-        logger.info(f"   Всего символов: {len(all_symbols)}")
-        logger.info(f"   После фильтра акций: {len(filtered_symbols)}")
-        logger.info(f"   После всех фильтров: {len(tracked_symbols)}")
-        logger.info(f"   В блэк-листе: {len(blacklist)}")
-        
-        if tracked_symbols:
-            sample = list(tracked_symbols)[:15]
-            logger.info(f"   Примеры: {', '.join(sample)}")
+            return True
             
-            # Отправляем уведомление без HTML
-            try:
-                if bot_instance:
-                    await bot_instance.send_message(
-                        chat_id=MY_USER_ID,
-                        text=f"✅ Сканер запущен\n\n"
-                             f"Отслеживается: {len(tracked_symbols)} пар\n"
-                             f"В блэк-листе: {len(blacklist)} монет\n"
-                             f"Уведомления отключены: {len(paused_alerts)} монет\n\n"
-                             f"Фильтры:\n"
-                             f"• 1D объём < {DAILY_VOLUME_LIMIT:,} USDT\n"
-                             f"• Пред. 5 мин < {MIN_PREV_VOLUME} USDT\n"
-                             f"• Тек. 5 мин > {MIN_CURRENT_VOLUME} USDT\n"
-                             f"• Цена: {MIN_PRICE:.4f} - {MAX_PRICE:.2f} USDT\n"
-                             f"• Исключены акции\n\n"
-                             f"Примеры:\n{', '.join(sample[:8])}"
-                    )
-                    logger.info("✅ Стартовое сообщение отправлено")
-                else:
-                    logger.error("❌ bot_instance не инициализирован для отправки стартового сообщения")
-            except Exception as e:
-                logger.error(f"❌ Не удалось отправить стартовое уведомление: {e}")
-        
-        return True
-        
-    except Exception as e:
-        logger.error(f"Критическая ошибка при загрузке символов: {e}")
-        return False
+        except Exception as e:
+            logger.error("Критическая ошибка при загрузке символов: %s", e)
+            return False
 
 
 # ====================== ФУНКЦИИ УПРАВЛЕНИЯ ДАННЫМИ ======================
@@ -378,6 +495,53 @@ async def load_data_from_db():
     return True
 
 
+def write_file_atomic(path: str, data: bytes):
+    """Пишем файл целиком через временный, чтобы при сбое не остался обрезанный"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+async def save_tracked_symbols():
+    """Сохраняем отфильтрованные пары на диск для быстрого перезапуска"""
+    try:
+        data = orjson.dumps({symbol: to_api_symbol(symbol) for symbol in tracked_symbols})
+        await asyncio.to_thread(write_file_atomic, TRACKED_CACHE_PATH, data)
+    except Exception as e:
+        logger.error("Не удалось сохранить кэш пар: %s", e)
+
+
+def load_cached_symbols() -> bool:
+    """Берём отфильтрованные пары из кэша на диске, если он свежий"""
+    global tracked_symbols
+    
+    try:
+        if time.time() - os.path.getmtime(TRACKED_CACHE_PATH) > TRACKED_CACHE_TTL:
+            return False
+        
+        with open(TRACKED_CACHE_PATH, "rb") as f:
+            cached = orjson.loads(f.read())
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.error("Не удалось прочитать кэш пар: %s", e)
+        return False
+    
+    # Без загрузки контрактов имена для API и WebSocket берём из кэша
+    symbols = set()
+    for symbol, contract in cached.items():
+        symbol = sys.intern(symbol)
+        contract = sys.intern(contract)
+        api_symbols[symbol] = contract
+        contract_symbols[contract] = symbol
+        symbols.add(symbol)
+    
+    tracked_symbols = symbols - blacklist
+    logger.info("Загружено %s пар из кэша %s", len(tracked_symbols), TRACKED_CACHE_PATH)
+    return bool(tracked_symbols)
+
+
 async def save_alert_to_history(symbol: str, prev_volume: int, curr_volume: int, 
                                prev_price: float, curr_price: float, 
                                volume_change_pct: float, price_change_pct: float):
@@ -392,254 +556,401 @@ async def save_alert_to_history(symbol: str, prev_volume: int, curr_volume: int,
         'price_change_pct': price_change_pct,
         'created_at': datetime.now()
     }
+    # deque с maxlen сам вытесняет самый старый алерт - без копирования списка
     alert_history.append(alert)
-    # Храним только последние 1000 алертов
-    if len(alert_history) > 1000:
-        alert_history = alert_history[-1000:]
 
 
 def get_recent_alerts(hours: int = 24):
-    """Получить недавние алерты"""
+    """Получить недавние алерты (новые первыми)"""
     cutoff_time = datetime.now() - timedelta(hours=hours)
-    return [alert for alert in alert_history if alert['created_at'] > cutoff_time]
+    # История пополняется по времени - идём с конца и останавливаемся на первом старом алерте
+    return list(takewhile(lambda alert: alert['created_at'] > cutoff_time, reversed(alert_history)))
+
+
+def expire_sent_alerts(max_age: int = 7200):
+    """Удаляем записи об отправленных алертах старше max_age секунд"""
+    # Записи идут по времени, поэтому снимаем только устаревшие с начала
+    cutoff = time.time() - max_age
+    while sent_alerts and next(iter(sent_alerts.values())) < cutoff:
+        sent_alerts.popitem(last=False)
 
 
 async def toggle_pause_symbol(query, symbol: str):
     """Включить/выключить уведомления для монеты"""
-    try:
-        if symbol in paused_alerts:
-            paused_alerts.remove(symbol)
-            action = "включены"
-        else:
-            paused_alerts.add(symbol)
-            action = "отключены"
-        
-        await query.edit_message_text(
-            f"✅ Уведомления для {symbol} {action}"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка переключения паузы: {e}")
-        await query.edit_message_text(
-            f"❌ Ошибка при изменении настроек"
-        )
+    if symbol in paused_alerts:
+        paused_alerts.remove(symbol)
+        action = "включены"
+    else:
+        paused_alerts.add(symbol)
+        action = "отключены"
+    
+    # Правки идут через общую очередь сообщения, ошибки Telegram логирует edit_in_background
+    edit_in_background(
+        query,
+        f"✅ Уведомления для {symbol} {action}"
+    )
 
 
 async def add_to_blacklist(query, symbol: str):
     """Добавить монету в блэк-лист"""
-    try:
-        if symbol in blacklist:
-            await query.edit_message_text(
-                f"ℹ️ {symbol} уже в блэк-листе"
-            )
-            return
-        
-        blacklist.add(symbol)
-        
-        # Удаляем из отслеживаемых
-        if symbol in tracked_symbols:
-            tracked_symbols.remove(symbol)
-        
-        # Удаляем из пауз
-        if symbol in paused_alerts:
-            paused_alerts.remove(symbol)
-        
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            f"✅ {symbol} добавлен в блэк-лист\n\n"
-            f"Монета исключена из отслеживания",
-            reply_markup=reply_markup
-        )
-    except Exception as e:
-        logger.error(f"Ошибка добавления в блэк-лист: {e}")
-        await query.edit_message_text(
-            f"❌ Ошибка при добавлении в блэк-лист"
+    if symbol in blacklist:
+        edit_in_background(
+            query,
+            f"ℹ️ {symbol} уже в блэк-листе"
         )
+        return
+    
+    blacklist.add(symbol)
+    
+    # Удаляем из отслеживаемых и из пауз
+    tracked_symbols.discard(symbol)
+    paused_alerts.discard(symbol)
+    
+    edit_in_background(
+        query,
+        f"✅ {symbol} добавлен в блэк-лист\n\n"
+        f"Монета исключена из отслеживания",
+        reply_markup=BACK_MARKUP
+    )
 
 
 async def remove_from_blacklist(query, symbol: str):
     """Удалить монету из блэк-листа"""
-    try:
-        if symbol not in blacklist:
-            await query.edit_message_text(
-                f"ℹ️ {symbol} нет в блэк-листе"
-            )
-            return
-        
-        blacklist.remove(symbol)
-        
-        await query.edit_message_text(
-            f"✅ {symbol} удален из блэк-листа\n\n"
-            f"Монета будет проверена при следующем обновлении списка"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка удаления из блэк-листа: {e}")
-        await query.edit_message_text(
-            f"❌ Ошибка при удалении из блэк-листа"
+    if symbol not in blacklist:
+        edit_in_background(
+            query,
+            f"ℹ️ {symbol} нет в блэк-листе"
         )
+        return
+    
+    blacklist.remove(symbol)
+    
+    edit_in_background(
+        query,
+        f"✅ {symbol} удален из блэк-листа\n\n"
+        f"Монета будет проверена при следующем обновлении списка"
+    )
+
+
+# ====================== WEBSOCKET (5m свечи) ======================
+async def sync_kline_subscriptions(ws, subscribed: set):
+    """Подписываемся на новые отслеживаемые пары и отписываемся от убранных"""
+    wanted = set(tracked_symbols)
+    
+    for symbol in wanted - subscribed:
+        await ws.send_json({
+            "method": "sub.kline",
+            "param": {"symbol": to_api_symbol(symbol), "interval": "Min5"}
+        }, dumps=json_dumps)
+        subscribed.add(symbol)
+    
+    for symbol in subscribed - wanted:
+        await ws.send_json({
+            "method": "unsub.kline",
+            "param": {"symbol": to_api_symbol(symbol), "interval": "Min5"}
+        }, dumps=json_dumps)
+        subscribed.discard(symbol)
+        ws_klines.pop(symbol, None)
+
+
+async def kline_stream_keepalive(ws, subscribed: set):
+    """Пинг раз в 20 секунд (MEXC рвёт соединение без пинга) и синхронизация подписок"""
+    while True:
+        await sync_kline_subscriptions(ws, subscribed)
+        await asyncio.sleep(20)
+        await ws.send_json({"method": "ping"}, dumps=json_dumps)
+
+
+async def kline_stream():
+    """Получаем текущие 5m свечи отслеживаемых пар через WebSocket MEXC"""
+    while True:
+        try:
+            async with http_session.ws_connect(MEXC_WS_URL) as ws:
+                logger.info("✅ WebSocket MEXC подключен")
+                subscribed = set()
+                keepalive = asyncio.create_task(kline_stream_keepalive(ws, subscribed))
+                
+                try:
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            continue
+                        
+                        payload = orjson.loads(msg.data)
+                        if payload.get("channel") != "push.kline":
+                            continue
+                        
+                        kline = payload.get("data") or {}
+                        symbol = contract_symbols.get(payload.get("symbol"))
+                        if symbol:
+                            ws_klines[symbol] = (kline["t"], kline["a"], kline["c"])
+                finally:
+                    keepalive.cancel()
+                    
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Ошибка WebSocket MEXC: %s", e)
+        
+        # Без соединения данные устаревают - до переподключения сканер работает через REST
+        ws_klines.clear()
+        logger.warning("WebSocket MEXC отключен, переподключаюсь через 5 секунд")
+        await asyncio.sleep(5)
 
 
 # ====================== СКАНЕР (5-минутные интервалы) ======================
+scan_semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+alert_queue = asyncio.Queue()
+
+
+async def alert_sender():
+    """Отправляем алерты из очереди, не задерживая сканер"""
+    while True:
+        alert = await alert_queue.get()
+        symbol = alert["symbol"]
+        
+        try:
+            # Логируем попытку отправки
+            logger.info("📤 Пытаюсь отправить алерт %s", symbol)
+            logger.info("   Chat ID: %s", MY_USER_ID)
+            
+            # Отправляем сообщение. При флуд-контроле Telegram ждём и повторяем этот же алерт,
+            # чтобы очередь не перемешивалась
+            while True:
+                try:
+                    result = await bot_instance.send_message(
+                        chat_id=MY_USER_ID,
+                        text=alert["text"],
+                        disable_web_page_preview=True,
+                        reply_markup=alert["reply_markup"]
+                    )
+                    break
+                except RetryAfter as e:
+                    # Новые версии PTB отдают retry_after как timedelta
+                    delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+                    logger.warning("Telegram просит подождать %s сек, повторяю алерт %s", delay, symbol)
+                    await asyncio.sleep(delay)
+            
+            logger.info("✅ АЛЕРТ УСПЕШНО ОТПРАВЛЕН: %s", symbol)
+            logger.info("   Message ID: %s", result.message_id)
+            
+        except Exception as e:
+            logger.error("❌ ОШИБКА ОТПРАВКИ АЛЕРТА %s:", symbol)
+            logger.error("   Тип ошибки: %s", type(e).__name__)
+            logger.error("   Сообщение: %s", e)
+            logger.error("   Chat ID: %s", MY_USER_ID)
+            
+            # Пробуем упрощенное сообщение без кнопок
+            try:
+                logger.info("   Пробую упрощенную отправку...")
+                await bot_instance.send_message(
+                    chat_id=MY_USER_ID,
+                    text=alert["simple_text"],
+                    disable_web_page_preview=True
+                )
+                logger.info("✅ Упрощенный алерт отправлен: %s", symbol)
+            except Exception as e2:
+                logger.error("❌ Ошибка упрощенной отправки: %s", e2)
+                # Не отправлен - разрешаем сканеру повторить алерт
+                sent_alerts.pop(alert["alert_id"], None)
+                scanned_volumes.pop(symbol, None)
+        
+        finally:
+            alert_queue.task_done()
+        
+        # Пауза только на обычном пути - при отмене задача завершается сразу
+        await asyncio.sleep(ALERT_SEND_INTERVAL)
+
+
+async def fetch_scan_data(symbol: str):
+    """Получаем 5m данные с ограничением числа одновременных запросов"""
+    async with scan_semaphore:
+        return await get_5m_kline_data(symbol)
+
+
+def select_scan_symbols(symbols: list, tickers: dict) -> list:
+    """Пары для запроса свечей по данным тикеров.
+    
+    Если за 24ч наторговано не больше MIN_CURRENT_VOLUME, за текущие 5 минут порог тоже
+    не пройден. Если объём 24ч совпадает с подтверждённым, сделок не было - свечи те же.
+    Подтверждённым объём становится только после двух успешных сканов с ним: свечи
+    (WebSocket или REST) могут отставать от тикера, и первый скан после сделки может
+    не увидеть её свечу. Пары без тикера сканируем всегда.
+    """
+    if not tickers:
+        return list(symbols)
+    return [
+        s for s in symbols
+        if s not in tickers
+        or (tickers[s][0] > MIN_CURRENT_VOLUME and tickers[s][0] != scanned_volumes.get(s, (None, None))[0])
+    ]
+
+
 async def volume_spike_scanner():
     """Сканируем все низковольюмные пары на всплески объёма на 5m"""
-    logger.info(f"🚀 Сканер запущен! Отслеживаю {len(tracked_symbols)} пар")
-    logger.info(f"Ваш USER_ID: {MY_USER_ID}")
-    logger.info(f"Условия: Пред. 5 мин < {MIN_PREV_VOLUME}, Тек. 5 мин > {MIN_CURRENT_VOLUME}")
+    logger.info("🚀 Сканер запущен! Отслеживаю %s пар", len(tracked_symbols))
+    logger.info("Ваш USER_ID: %s", MY_USER_ID)
+    logger.info("Условия: Пред. 5 мин < %s, Тек. 5 мин > %s", MIN_PREV_VOLUME, MIN_CURRENT_VOLUME)
     
     if len(tracked_symbols) == 0:
         logger.warning("Нет пар для отслеживания!")
         return
     
+    loop = asyncio.get_running_loop()
     iteration = 0
+    next_refresh_at = loop.time() + 6 * 3600
     
     while True:
         try:
-            current_5min = datetime.now().strftime("%Y%m%d%H%M")[:11] + str(int(datetime.now().minute / 5) * 5).zfill(2)
+            iteration_started = loop.time()
+            # Время берём один раз на итерацию: и для id 5-минутки, и для отметок алертов
+            now = time.time()
+            now_dt = datetime.fromtimestamp(now)
+            current_5min = f"{now_dt:%Y%m%d%H}{now_dt.minute // 5 * 5:02d}"
             iteration += 1
             
             if iteration % 5 == 1:
-                logger.info(f"Итерация {iteration}. Пар: {len(tracked_symbols)}. Алертов за сессию: {len(sent_alerts)}")
+                logger.info("Итерация %s. Пар: %s. Алертов за сессию: %s", iteration, len(tracked_symbols), len(sent_alerts))
             
             # Обновляем список символов каждые 6 часов
-            if iteration % 432 == 0:  # Каждые 6 часов (при проверке каждые 50 секунд)
+            if iteration_started >= next_refresh_at:
                 logger.info("🔄 Обновляю список символов (каждые 6 часов)...")
                 await load_and_filter_symbols()
+                next_refresh_at = loop.time() + 6 * 3600
                 continue
             
-            symbols_list = list(tracked_symbols)
-            if not symbols_list:
+            if not tracked_symbols:
                 logger.warning("Нет символов для сканирования")
                 await asyncio.sleep(60)
                 continue
             
-            # Сканируем все символы
-            max_per_iteration = len(symbols_list)
-            random.shuffle(symbols_list)
+            # Сканируем все символы, кроме монет с отключенными уведомлениями - их запрашиваем параллельно
+            symbols_list = list(tracked_symbols - paused_alerts)
             
-            for symbol in symbols_list[:max_per_iteration]:
+            # Один запрос тикеров отсекает пары, где свечи заведомо не дадут алерта
+            tickers = await get_all_tickers()
+            symbols_list = select_scan_symbols(symbols_list, tickers)
+            
+            results = await asyncio.gather(
+                *(fetch_scan_data(symbol) for symbol in symbols_list),
+                return_exceptions=True
+            )
+            
+            for symbol, data in zip(symbols_list, results):
                 try:
-                    # Пропускаем если уведомления отключены
-                    if symbol in paused_alerts:
+                    if not data or isinstance(data, Exception):
+                        # Свечи не получены - пара будет запрошена снова на следующем проходе
+                        scanned_volumes.pop(symbol, None)
                         continue
                     
-                    data = await get_5m_kline_data(symbol)
-                    if not data:
-                        continue
+                    if tickers and symbol in tickers:
+                        # Подтверждаем объём прошлого скана, текущий - проверим ещё раз
+                        previous = scanned_volumes.get(symbol, (None, None))[1]
+                        scanned_volumes[symbol] = (previous, tickers[symbol][0])
                     
                     prev_vol = data["prev_volume"]
                     curr_vol = data["curr_volume"]
+                    
+                    # Проверяем условие всплеска за 5 минут до любой работы со строками
+                    if prev_vol >= MIN_PREV_VOLUME or curr_vol <= MIN_CURRENT_VOLUME:
+                        continue
+                    
+                    alert_id = f"{symbol}_{current_5min}"
+                    
+                    if alert_id in sent_alerts:
+                        logger.debug("Алерт %s уже отправлен в этой 5-минутке", symbol)
+                        continue
+                    
                     prev_price = data["prev_price"]
                     curr_price = data["curr_price"]
+                    volume_change_pct = ((curr_vol - prev_vol) / max(prev_vol, 1)) * 100
+                    if prev_price > 0:
+                        price_change_pct = ((curr_price - prev_price) / prev_price) * 100
+                    else:
+                        price_change_pct = 0
                     
-                    # Проверяем условие всплеска за 5 минут
-                    if prev_vol < MIN_PREV_VOLUME and curr_vol > MIN_CURRENT_VOLUME:
-                        alert_id = f"{symbol}_{current_5min}"
-                        
-                        if alert_id in sent_alerts:
-                            logger.debug(f"Алерт {symbol} уже отправлен в этой 5-минутке")
-                            continue
-                        
-                        volume_change_pct = ((curr_vol - prev_vol) / max(prev_vol, 1)) * 100
-                        if prev_price > 0:
-                            price_change_pct = ((curr_price - prev_price) / prev_price) * 100
-                        else:
-                            price_change_pct = 0
-                        
-                        # ВСЕ УСЛОВИЯ ВЫПОЛНЕНЫ - ОТПРАВЛЯЕМ АЛЕРТ
-                        logger.info(f"🚨 АЛЕРТ НАЙДЕН: {symbol}")
-                        logger.info(f"   Пред. 5 мин: {prev_vol:,} USDT ( < {MIN_PREV_VOLUME})")
-                        logger.info(f"   Тек. 5 мин: {curr_vol:,} USDT ( > {MIN_CURRENT_VOLUME})")
-                        logger.info(f"   Изменение: +{volume_change_pct:.0f}%")
-                        logger.info(f"   Изменение цены: {price_change_pct:+.2f}%")
-                        
-                        # Сохраняем алерт в историю
-                        await save_alert_to_history(
-                            symbol, prev_vol, curr_vol, 
-                            prev_price, curr_price,
-                            volume_change_pct, price_change_pct
-                        )
-                        
-                        # Создаем клавиатуру
-                        keyboard = [
-                            [
-                                InlineKeyboardButton("🔕 Выключить увед.", callback_data=f"pause_{symbol}"),
-                                InlineKeyboardButton("🚫 В блэк-лист", callback_data=f"blacklist_{symbol}")
-                            ]
+                    # ВСЕ УСЛОВИЯ ВЫПОЛНЕНЫ - ОТПРАВЛЯЕМ АЛЕРТ
+                    logger.info("🚨 АЛЕРТ НАЙДЕН: %s", symbol)
+                    logger.info("   Пред. 5 мин: %d USDT ( < %s)", prev_vol, MIN_PREV_VOLUME)
+                    logger.info("   Тек. 5 мин: %d USDT ( > %s)", curr_vol, MIN_CURRENT_VOLUME)
+                    logger.info("   Изменение: +%.0f%%", volume_change_pct)
+                    logger.info("   Изменение цены: %+.2f%%", price_change_pct)
+                    
+                    # Сохраняем алерт в историю
+                    await save_alert_to_history(
+                        symbol, prev_vol, curr_vol, 
+                        prev_price, curr_price,
+                        volume_change_pct, price_change_pct
+                    )
+                    
+                    # Создаем клавиатуру
+                    keyboard = [
+                        [
+                            InlineKeyboardButton("🔕 Выключить увед.", callback_data=f"pause_{symbol}"),
+                            InlineKeyboardButton("🚫 В блэк-лист", callback_data=f"blacklist_{symbol}")
                         ]
-                        reply_markup = InlineKeyboardMarkup(keyboard)
-                        
-                        # Сообщение без HTML тегов
-                        message = (
-                            f"⚡ 5-МИНУТНЫЙ АЛЕРТ: {symbol}\n"
-                            f"Объём за 5 мин: {prev_vol:,} → {curr_vol:,} USDT\n"
-                            f"Изменение: {volume_change_pct:+.0f}%\n"
-                            f"Цена: {price_change_pct:+.2f}%\n"
-                            f"https://www.mexc.com/futures/{symbol[:-4]}_USDT"
-                        )
-                        
-                        try:
-                            # Логируем попытку отправки
-                            logger.info(f"📤 Пытаюсь отправить алерт {symbol}")
-                            logger.info(f"   Chat ID: {MY_USER_ID}")
-                            
-                            # Основной способ: Создаем нового бота для отправки
-                            temp_bot = Bot(token=TELEGRAM_TOKEN)
-                            
-                            # Отправляем сообщение
-                            result = await temp_bot.send_message(
-                                chat_id=MY_USER_ID,
-                                text=message,
-                                disable_web_page_preview=True,
-                                reply_markup=reply_markup
-                            )
-                            
-                            logger.info(f"✅ АЛЕРТ УСПЕШНО ОТПРАВЛЕН: {symbol}")
-                            logger.info(f"   Message ID: {result.message_id}")
-                            sent_alerts[alert_id] = time.time()
-                            
-                        except Exception as e:
-                            logger.error(f"❌ ОШИБКА ОТПРАВКИ АЛЕРТА {symbol}:")
-                            logger.error(f"   Тип ошибки: {type(e).__name__}")
-                            logger.error(f"   Сообщение: {str(e)}")
-                            logger.error(f"   Chat ID: {MY_USER_ID}")
-                            
-                            # Пробуем упрощенное сообщение без кнопок
-                            try:
-                                logger.info(f"   Пробую упрощенную отправку...")
-                                temp_bot = Bot(token=TELEGRAM_TOKEN)
-                                simple_msg = f"⚡ {symbol} | 5 мин: {prev_vol:,}→{curr_vol:,} (+{volume_change_pct:.0f}%)"
-                                await temp_bot.send_message(
-                                    chat_id=MY_USER_ID,
-                                    text=simple_msg,
-                                    disable_web_page_preview=True
-                                )
-                                logger.info(f"✅ Упрощенный алерт отправлен: {symbol}")
-                                sent_alerts[alert_id] = time.time()
-                            except Exception as e2:
-                                logger.error(f"❌ Ошибка упрощенной отправки: {e2}")
-                            
+                    ]
+                    reply_markup = InlineKeyboardMarkup(keyboard)
+                    
+                    # Сообщение без HTML тегов
+                    message = format_alert_message(
+                        title="5-МИНУТНЫЙ АЛЕРТ",
+                        symbol=symbol,
+                        prev_vol=prev_vol,
+                        curr_vol=curr_vol,
+                        volume_change_pct=volume_change_pct,
+                        price_change_pct=price_change_pct,
+                        contract=to_api_symbol(symbol)
+                    )
+                    
+                    # Отправка идёт в отдельной задаче, сканер не ждёт Telegram.
+                    # Помечаем алерт сразу, чтобы не поставить его в очередь повторно
+                    sent_alerts[alert_id] = now
+                    alert_queue.put_nowait({
+                        "alert_id": alert_id,
+                        "symbol": symbol,
+                        "text": message,
+                        "reply_markup": reply_markup,
+                        "simple_text": f"⚡ {symbol} | 5 мин: {prev_vol:,}→{curr_vol:,} (+{volume_change_pct:.0f}%)"
+                    })
+                    
                 except Exception as e:
-                    logger.error(f"Ошибка обработки {symbol}: {str(e)}")
+                    logger.error("Ошибка обработки %s: %s", symbol, e)
+                    scanned_volumes.pop(symbol, None)
                     continue
             
             # Очищаем старые алерты
-            current_time = time.time()
-            expired = [k for k, v in sent_alerts.items() if current_time - v > 7200]
-            for exp in expired:
-                sent_alerts.pop(exp, None)
+            expire_sent_alerts()
             
-            await asyncio.sleep(50)  # Проверяем каждые 50 секунд (чуть меньше 5 минут)
+            # Спим остаток интервала по монотонным часам, чтобы время итерации не накапливало дрейф
+            elapsed = loop.time() - iteration_started
+            logger.debug("Итерация %s заняла %.1f сек", iteration, elapsed)
+            await asyncio.sleep(max(0, SCAN_INTERVAL - elapsed))
             
         except asyncio.CancelledError:
             logger.info("Сканер остановлен")
             break
         except Exception as e:
-            logger.error(f"Ошибка в сканере: {e}")
+            logger.error("Ошибка в сканере: %s", e)
             await asyncio.sleep(60)
 
 
 # ====================== TELEGRAM КОМАНДЫ И КНОПКИ ======================
+def owner_only(handler):
+    """Молча игнорирует апдейты не от владельца - до любой работы в хендлере"""
+    @wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if not user or user.id != MY_USER_ID:
+            # debug, а не warning: спам посторонних не должен забивать логи
+            logger.debug("Отклонён апдейт от пользователя %s", user.id if user else None)
+            if update.callback_query:
+                # Закрываем callback, иначе у клиента крутится индикатор до таймаута
+                await update.callback_query.answer()
+            return
+        return await handler(update, context)
+    return wrapper
+
+
 async def safe_reply(update: Update, text: str):
     """Безопасная отправка сообщения"""
     try:
@@ -653,57 +964,77 @@ async def safe_reply(update: Update, text: str):
                 text=text
             )
         else:
-            logger.error(f"Не удалось отправить сообщение: {text}")
+            logger.error("Не удалось отправить сообщение: %s", text)
     except Exception as e:
-        logger.error(f"Ошибка при отправке сообщения: {e}")
+        logger.error("Ошибка при отправке сообщения: %s", e)
 
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if update.effective_user.id != MY_USER_ID:
-        await safe_reply(update, "🚫 Доступ запрещён")
-        return
+# Последняя фоновая правка каждого сообщения: держит ссылку на задачу (чтобы её не собрал GC)
+# и выстраивает правки одного сообщения по порядку нажатий
+edit_tasks = {}  # (chat_id, message_id) или inline_message_id -> задача
+
+
+async def _edit_after(previous, query, text: str, kwargs: dict):
+    """Правит сообщение после завершения предыдущей правки того же сообщения"""
+    if previous:
+        await asyncio.wait([previous])
+    await query.edit_message_text(text, **kwargs)
+
+
+def edit_in_background(query, text: str, **kwargs):
+    """Правка сообщения без ожидания ответа Telegram - для меню, где результат не нужен.
     
-    keyboard = [
-        [InlineKeyboardButton("📋 Список пар", callback_data="list_symbols")],
-        [InlineKeyboardButton("🚫 Блэк-лист", callback_data="blacklist_menu")],
-        [InlineKeyboardButton("🔕 Паузы", callback_data="paused_menu")],
-        [InlineKeyboardButton("📊 Статистика", callback_data="stats")],
-        [InlineKeyboardButton("🔄 Обновить", callback_data="refresh")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    Правки одного сообщения уходят строго друг за другом, поэтому при быстрых нажатиях
+    на экране остаётся последнее выбранное меню.
+    """
+    key = (query.message.chat_id, query.message.message_id) if query.message else query.inline_message_id
+    task = asyncio.create_task(_edit_after(edit_tasks.get(key), query, text, kwargs))
+    edit_tasks[key] = task
     
-    text = (
-        "📊 MEXC 5-MIN Volume Scanner\n\n"
-        f"Статус: ✅ Активен\n"
+    def done(task: asyncio.Task):
+        if edit_tasks.get(key) is task:
+            del edit_tasks[key]
+        if not task.cancelled() and task.exception():
+            logger.error("Ошибка редактирования сообщения: %s", task.exception())
+    
+    task.add_done_callback(done)
+    return task
+
+
+def build_main_menu_text() -> str:
+    """Текст главного меню: форматируются только счётчики"""
+    return (
+        f"{MAIN_MENU_HEADER}"
         f"Отслеживаемых пар: {len(tracked_symbols)}\n"
         f"В блэк-листе: {len(blacklist)} монет\n"
         f"Уведомления отключены: {len(paused_alerts)} монет\n\n"
-        f"Фильтры:\n"
-        f"• 1D объём < {DAILY_VOLUME_LIMIT:,} USDT\n"
-        f"• Пред. 5 мин < {MIN_PREV_VOLUME} USDT\n"
-        f"• Тек. 5 мин > {MIN_CURRENT_VOLUME} USDT\n"
-        f"• Цена: {MIN_PRICE:.4f} - {MAX_PRICE:.2f} USDT\n\n"
-        f"Выберите действие:"
+        f"{MAIN_MENU_FOOTER}"
     )
+
+
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id != MY_USER_ID:
+        await safe_reply(update, "🚫 Доступ запрещён")
+        return
+    
+    text = build_main_menu_text()
     
     if update.message:
-        await update.message.reply_text(text, reply_markup=reply_markup)
+        await update.message.reply_text(text, reply_markup=MAIN_MENU_MARKUP)
     elif bot_instance:
         await bot_instance.send_message(
             chat_id=MY_USER_ID,
             text=text,
-            reply_markup=reply_markup
+            reply_markup=MAIN_MENU_MARKUP
         )
 
 
+@owner_only
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик нажатий на кнопки"""
     query = update.callback_query
     await query.answer()
     
-    if update.effective_user.id != MY_USER_ID:
-        return
-    
     data = query.data
     
     if data == "list_symbols":
@@ -739,201 +1070,147 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def start_callback(query):
     """Обработчик команды start для callback"""
-    keyboard = [
-        [InlineKeyboardButton("📋 Список пар", callback_data="list_symbols")],
-        [InlineKeyboardButton("🚫 Блэк-лист", callback_data="blacklist_menu")],
-        [InlineKeyboardButton("🔕 Паузы", callback_data="paused_menu")],
-        [InlineKeyboardButton("📊 Статистика", callback_data="stats")],
-        [InlineKeyboardButton("🔄 Обновить", callback_data="refresh")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    text = build_main_menu_text()
     
-    text = (
-        "📊 MEXC 5-MIN Volume Scanner\n\n"
-        f"Статус: ✅ Активен\n"
-        f"Отслеживаемых пар: {len(tracked_symbols)}\n"
-        f"В блэк-листе: {len(blacklist)} монет\n"
-        f"Уведомления отключены: {len(paused_alerts)} монет\n\n"
-        f"Фильтры:\n"
-        f"• 1D объём < {DAILY_VOLUME_LIMIT:,} USDT\n"
-        f"• Пред. 5 мин < {MIN_PREV_VOLUME} USDT\n"
-        f"• Тек. 5 мин > {MIN_CURRENT_VOLUME} USDT\n"
-        f"• Цена: {MIN_PRICE:.4f} - {MAX_PRICE:.2f} USDT\n\n"
-        f"Выберите действие:"
-    )
-    
-    await query.edit_message_text(
+    edit_in_background(
+        query,
         text,
-        reply_markup=reply_markup
+        reply_markup=MAIN_MENU_MARKUP
     )
 
 
 async def show_symbols_list(query):
     """Показать список отслеживаемых пар"""
     if not tracked_symbols:
-        await query.edit_message_text("ℹ️ Нет отслеживаемых пар")
+        edit_in_background(query, "ℹ️ Нет отслеживаемых пар")
         return
     
-    symbols_list = sorted(list(tracked_symbols))
-    
-    # Показываем первые 20 символов
-    symbols_text = "\n".join([f"• {symbol}" for symbol in symbols_list[:20]])
+    # Показываем первые 20 символов - частичная сортировка вместо сортировки всего набора
+    symbols_list = heapq.nsmallest(20, tracked_symbols)
+    symbols_text = "\n".join([f"• {symbol}" for symbol in symbols_list])
     
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    edit_in_background(
+        query,
         f"📋 Отслеживаемые пары\n\n"
         f"Всего: {len(tracked_symbols)} пар\n\n"
         f"{symbols_text}\n\n"
-        f"Показано {min(20, len(symbols_list))} из {len(symbols_list)}",
-        reply_markup=reply_markup
+        f"Показано {len(symbols_list)} из {len(tracked_symbols)}",
+        reply_markup=BACK_MARKUP
     )
 
 
 async def show_blacklist_menu(query):
     """Показать меню блэк-листа"""
     if not blacklist:
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
+        edit_in_background(
+            query,
             f"🚫 Блэк-лист\n\n"
             f"В блэк-листе нет монет",
-            reply_markup=reply_markup
+            reply_markup=BACK_MARKUP
         )
         return
     
-    blacklist_list = sorted(list(blacklist))
-    blacklist_text = "\n".join([f"• {symbol}" for symbol in blacklist_list[:15]])
-    
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    blacklist_list = heapq.nsmallest(15, blacklist)
+    blacklist_text = "\n".join([f"• {symbol}" for symbol in blacklist_list])
     
-    await query.edit_message_text(
+    edit_in_background(
+        query,
         f"🚫 Блэк-лист\n\n"
         f"Всего: {len(blacklist)} монет\n\n"
         f"{blacklist_text}\n\n"
-        f"Показано {min(15, len(blacklist_list))} из {len(blacklist_list)}",
-        reply_markup=reply_markup
+        f"Показано {len(blacklist_list)} из {len(blacklist)}",
+        reply_markup=BACK_MARKUP
     )
 
 
 async def show_paused_menu(query):
     """Показать меню отключенных уведомлений"""
     if not paused_alerts:
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
+        edit_in_background(
+            query,
             f"🔕 Отключенные уведомления\n\n"
             f"Нет отключенных уведомлений",
-            reply_markup=reply_markup
+            reply_markup=BACK_MARKUP
         )
         return
     
-    paused_list = sorted(list(paused_alerts))
-    paused_text = "\n".join([f"• {symbol}" for symbol in paused_list[:15]])
+    paused_list = heapq.nsmallest(15, paused_alerts)
+    paused_text = "\n".join([f"• {symbol}" for symbol in paused_list])
     
-    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await query.edit_message_text(
+    edit_in_background(
+        query,
         f"🔕 Отключенные уведомления\n\n"
         f"Всего: {len(paused_alerts)} монет\n\n"
         f"{paused_text}\n\n"
-        f"Показано {min(15, len(paused_list))} из {len(paused_list)}",
-        reply_markup=reply_markup
+        f"Показано {len(paused_list)} из {len(paused_alerts)}",
+        reply_markup=BACK_MARKUP
     )
 
 
 async def refresh_symbols(query):
     """Обновить список пар"""
-    await query.edit_message_text("🔄 Обновляю список пар...")
+    # Обе правки идут через очередь сообщения: итог не перетрёт ещё не отправленное меню
+    edit_in_background(query, "🔄 Обновляю список пар...")
     
     success = await load_and_filter_symbols()
     
     if success:
-        await query.edit_message_text(
+        edit_in_background(
+            query,
             f"✅ Обновлено!\n"
             f"Отслеживается: {len(tracked_symbols)} пар\n"
             f"В блэк-листе: {len(blacklist)} монет"
         )
     else:
-        await query.edit_message_text("❌ Ошибка обновления")
+        edit_in_background(query, "❌ Ошибка обновления")
+
+
+def build_stats_text() -> str:
+    """Текст статистики за 24ч - общий для кнопки и команды /stats"""
+    recent_alerts = get_recent_alerts(24)
+    
+    # Находим самые активные монеты
+    symbol_counts = Counter(alert['symbol'] for alert in recent_alerts)
+    top_symbols = symbol_counts.most_common(5)
+    
+    parts = [
+        "📊 Статистика за 24ч\n\n"
+        f"Всего алертов: {len(recent_alerts)}\n"
+        f"Уникальных пар: {len(symbol_counts)}\n"
+        f"Отслеживаемых пар: {len(tracked_symbols)}\n"
+        f"В блэк-листе: {len(blacklist)}\n"
+        f"Пауз уведомлений: {len(paused_alerts)}\n\n"
+    ]
+    
+    if top_symbols:
+        parts.append("Топ-5 активных пар:\n")
+        parts.extend(f"• {symbol}: {count} алертов\n" for symbol, count in top_symbols)
+    
+    return "".join(parts)
 
 
 async def stats_db_query(query):
     """Статистика через callback"""
-    try:
-        recent_alerts = get_recent_alerts(24)
-        
-        alert_count = len(recent_alerts)
-        unique_symbols = len(set([alert['symbol'] for alert in recent_alerts]))
-        
-        # Находим самые активные монеты
-        symbol_counts = {}
-        for alert in recent_alerts:
-            symbol = alert['symbol']
-            symbol_counts[symbol] = symbol_counts.get(symbol, 0) + 1
-        
-        top_symbols = sorted(symbol_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        
-        stats_text = "📊 Статистика за 24ч\n\n"
-        stats_text += f"Всего алертов: {alert_count}\n"
-        stats_text += f"Уникальных пар: {unique_symbols}\n"
-        stats_text += f"В блэк-листе: {len(blacklist)}\n"
-        stats_text += f"Пауз уведомлений: {len(paused_alerts)}\n\n"
-        
-        if top_symbols:
-            stats_text += "Топ-5 активных пар:\n"
-            for symbol, count in top_symbols:
-                stats_text += f"• {symbol}: {count} алертов\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(stats_text, reply_markup=reply_markup)
-        
-    except Exception as e:
-        logger.error(f"Ошибка получения статистики: {e}")
-        await query.edit_message_text("❌ Ошибка получения статистики")
+    # Ошибки фоновой правки логирует edit_in_background
+    edit_in_background(query, build_stats_text(), reply_markup=BACK_MARKUP)
 
 
+@owner_only
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда статистики"""
-    if update.effective_user.id != MY_USER_ID:
-        return
-    
     try:
-        recent_alerts = get_recent_alerts(24)
-        
-        alert_count = len(recent_alerts)
-        unique_symbols = len(set([alert['symbol'] for alert in recent_alerts]))
-        
-        stats_text = (
-            "📊 Статистика за 24ч\n\n"
-            f"Всего алертов: {alert_count}\n"
-            f"Уникальных пар: {unique_symbols}\n"
-            f"Отслеживаемых пар: {len(tracked_symbols)}\n"
-            f"В блэк-листе: {len(blacklist)}\n"
-            f"Пауз уведомлений: {len(paused_alerts)}\n\n"
-            f"Время: {datetime.now().strftime('%H:%M:%S')}"
-        )
-        
+        stats_text = build_stats_text().rstrip("\n") + f"\n\nВремя: {datetime.now().strftime('%H:%M:%S')}"
         await update.message.reply_text(stats_text)
         
     except Exception as e:
-        logger.error(f"Ошибка получения статистики: {e}")
+        logger.error("Ошибка получения статистики: %s", e)
         await update.message.reply_text("❌ Ошибка получения статистики")
 
 
 # ====================== ОТЛАДОЧНЫЕ КОМАНДЫ ======================
+@owner_only
 async def env_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Проверка переменных окружения"""
-    if update.effective_user.id != MY_USER_ID:
-        return
-    
     check_text = (
         f"🔍 Проверка переменных окружения:\n\n"
         f"TELEGRAM_TOKEN: {'УСТАНОВЛЕН' if TELEGRAM_TOKEN and TELEGRAM_TOKEN != 'ваш_токен_бота' else '❌ НЕ УСТАНОВЛЕН'}\n"
@@ -991,7 +1268,7 @@ async def test_symbol(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Проверяем 1D объем
-        daily_volume = await get_1d_volume(symbol)
+        daily_volume, _ = await get_1d_stats(symbol)
         
         # Проверяем 5m данные
         data = await get_5m_kline_data(symbol)
@@ -1054,21 +1331,21 @@ async def test_symbol(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
 
 
+@owner_only
 async def send_test_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправить тестовый алерт прямо сейчас"""
-    if update.effective_user.id != MY_USER_ID:
-        return
-    
     test_symbol = "HIPPOUSDT" if not context.args else context.args[0].upper()
     
     try:
         # Создаем тестовый алерт
-        message = (
-            f"⚡ ТЕСТОВЫЙ АЛЕРТ (5-минутный): {test_symbol}\n"
-            f"Объём за 5 мин: 61 → 6,438 USDT\n"
-            f"Изменение: +10454%\n"
-            f"Цена: -0.10%\n"
-            f"https://www.mexc.com/futures/{test_symbol[:-4]}_USDT"
+        message = format_alert_message(
+            title="ТЕСТОВЫЙ АЛЕРТ (5-минутный)",
+            symbol=test_symbol,
+            prev_vol=61,
+            curr_vol=6438,
+            volume_change_pct=10454,
+            price_change_pct=-0.10,
+            contract=to_api_symbol(test_symbol)
         )
         
         keyboard = [
@@ -1088,7 +1365,7 @@ async def send_test_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 await update.message.reply_text(message, reply_markup=reply_markup, disable_web_page_preview=True)
                 methods.append("reply_text")
             except Exception as e:
-                logger.error(f"Ошибка reply_text: {e}")
+                logger.error("Ошибка reply_text: %s", e)
         
         # Способ 2: через создание нового бота
         try:
@@ -1101,7 +1378,7 @@ async def send_test_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             methods.append("новый бот")
         except Exception as e:
-            logger.error(f"Ошибка нового бота: {e}")
+            logger.error("Ошибка нового бота: %s", e)
         
         # Способ 3: через bot_instance
         if bot_instance:
@@ -1114,7 +1391,7 @@ async def send_test_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 methods.append("bot_instance")
             except Exception as e:
-                logger.error(f"Ошибка bot_instance: {e}")
+                logger.error("Ошибка bot_instance: %s", e)
         
         # Отправляем отчет
         report = f"Тестовый алерт отправлен для {test_symbol}\nИспользованные методы: {', '.join(methods) if methods else 'ни один не сработал'}"
@@ -1125,7 +1402,7 @@ async def send_test_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await bot_instance.send_message(chat_id=MY_USER_ID, text=report)
         
     except Exception as e:
-        logger.error(f"Ошибка в send_test_alert: {e}")
+        logger.error("Ошибка в send_test_alert: %s", e)
 
 
 async def debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1179,11 +1456,9 @@ async def debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.error("Не удалось отправить debug сообщение - нет доступных методов")
 
 
+@owner_only
 async def test_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Тест отправки сообщения ботом"""
-    if update.effective_user.id != MY_USER_ID:
-        return
-    
     test_message = "🤖 Тестовое сообщение от бота\nВремя: " + datetime.now().strftime("%H:%M:%S")
     
     # Способ 1: через reply
@@ -1191,7 +1466,7 @@ async def test_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Тест 1: reply_text")
         logger.info("✅ Тест 1: reply_text - успешно")
     except Exception as e:
-        logger.error(f"❌ Тест 1: reply_text - ошибка: {e}")
+        logger.error("❌ Тест 1: reply_text - ошибка: %s", e)
     
     # Способ 2: через новый бот
     try:
@@ -1202,7 +1477,7 @@ async def test_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         logger.info("✅ Тест 2: через новый бот - успешно")
     except Exception as e:
-        logger.error(f"❌ Тест 2: через новый бот - ошибка: {e}")
+        logger.error("❌ Тест 2: через новый бот - ошибка: %s", e)
     
     # Способ 3: через bot_instance
     if bot_instance:
@@ -1213,18 +1488,16 @@ async def test_bot(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             logger.info("✅ Тест 3: через bot_instance - успешно")
         except Exception as e:
-            logger.error(f"❌ Тест 3: через bot_instance - ошибка: {e}")
+            logger.error("❌ Тест 3: через bot_instance - ошибка: %s", e)
     else:
         logger.error("❌ bot_instance не инициализирован")
     
     await update.message.reply_text("✅ Тесты отправки завершены. Проверьте логи.")
 
 
+@owner_only
 async def force_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Принудительно отправить алерт для символа прямо сейчас"""
-    if update.effective_user.id != MY_USER_ID:
-        return
-    
     if not context.args:
         await update.message.reply_text("Укажите символ: /forcealert CHFUSDT")
         return
@@ -1260,17 +1533,18 @@ async def force_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        message = (
-            f"⚡ ПРИНУДИТЕЛЬНЫЙ АЛЕРТ: {symbol}\n"
-            f"Объём за 5 мин: {prev_vol:,} → {curr_vol:,} USDT\n"
-            f"Изменение: {volume_change_pct:+.0f}%\n"
-            f"Цена: {price_change_pct:+.2f}%\n"
-            f"https://www.mexc.com/futures/{symbol[:-4]}_USDT"
+        message = format_alert_message(
+            title="ПРИНУДИТЕЛЬНЫЙ АЛЕРТ",
+            symbol=symbol,
+            prev_vol=prev_vol,
+            curr_vol=curr_vol,
+            volume_change_pct=volume_change_pct,
+            price_change_pct=price_change_pct,
+            contract=to_api_symbol(symbol)
         )
         
         # Отправляем
-        temp_bot = Bot(token=TELEGRAM_TOKEN)
-        result = await temp_bot.send_message(
+        result = await bot_instance.send_message(
             chat_id=MY_USER_ID,
             text=message,
             disable_web_page_preview=True,
@@ -1288,30 +1562,30 @@ async def force_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
-        logger.error(f"Ошибка в force_alert: {e}")
+        logger.error("Ошибка в force_alert: %s", e)
 
 
-async def run_telegram_polling():
-    """Запуск Telegram polling"""
-    try:
-        await application.initialize()
-        await application.start()
-        logger.info("Telegram бот готов к работе")
-        await application.updater.start_polling(drop_pending_updates=True)
-    except Exception as e:
-        logger.error(f"Ошибка запуска Telegram бота: {e}")
+# ====================== ЗАПУСК ======================
+async def stop_telegram():
+    """Остановка Telegram в порядке, обратном запуску"""
+    if not application:
+        return
+    if application.updater and application.updater.running:
+        await application.updater.stop()
+    if application.running:
+        await application.stop()
+    await application.shutdown()
 
 
-# ====================== ЗАПУСК ======================
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global scanner_task, application, bot_instance
+    global scanner_task, kline_stream_task, alert_sender_task, symbols_refresh_task, application, bot_instance, http_session
     
     logger.info("=== Запуск MEXC 5-MIN Volume Scanner ===")
     
     # Проверка токена
-    logger.info(f"TELEGRAM_TOKEN: {'*' * len(TELEGRAM_TOKEN) if TELEGRAM_TOKEN else 'НЕ УСТАНОВЛЕН'}")
-    logger.info(f"MY_USER_ID: {MY_USER_ID}")
+    logger.info("TELEGRAM_TOKEN: %s", '*' * len(TELEGRAM_TOKEN) if TELEGRAM_TOKEN else 'НЕ УСТАНОВЛЕН')
+    logger.info("MY_USER_ID: %s", MY_USER_ID)
     
     if not TELEGRAM_TOKEN or TELEGRAM_TOKEN == "ваш_токен_бота":
         logger.error("❌ TELEGRAM_TOKEN не установлен!")
@@ -1321,19 +1595,31 @@ async def lifespan(app: FastAPI):
         logger.error("❌ MY_USER_ID не установлен!")
         raise ValueError("MY_USER_ID не установлен")
     
-    # Создаем экземпляр бота
+    # Создаем Telegram приложение - его бот используется для всех отправок
     try:
-        bot_instance = Bot(token=TELEGRAM_TOKEN)
+        application = Application.builder().token(TELEGRAM_TOKEN).build()
+        bot_instance = application.bot
         logger.info("✅ Telegram бот создан успешно")
     except Exception as e:
-        logger.error(f"❌ Ошибка создания бота: {e}")
+        logger.error("❌ Ошибка создания бота: %s", e)
         raise
     
+    # Общая HTTP-сессия для MEXC: keep-alive соединения вместо TCP+TLS рукопожатия на каждый запрос
+    http_session = aiohttp.ClientSession(
+        json_serialize=json_dumps,
+        connector=aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=64,
+            ttl_dns_cache=300,
+            keepalive_timeout=75,
+            enable_cleanup_closed=True
+        )
+    )
+    
     # Загружаем данные
     await load_data_from_db()
     
-    # Инициализируем Telegram приложение
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Регистрируем обработчики
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("stats", stats_command))
     application.add_handler(CommandHandler("debug", debug))
@@ -1344,45 +1630,75 @@ async def lifespan(app: FastAPI):
     application.add_handler(CommandHandler("forcealert", force_alert))
     application.add_handler(CallbackQueryHandler(button_handler))
     
-    # Загружаем и фильтруем символы
-    await load_and_filter_symbols()
+    # Запускаем Telegram до загрузки символов - стартовое сообщение уходит уже через
+    # инициализированного бота. start_polling сам создаёт задачу опроса и сразу возвращается.
+    # Недоступность Telegram не должна останавливать сканер MEXC - логируем и продолжаем
+    try:
+        await application.initialize()
+        await application.start()
+        await application.updater.start_polling(drop_pending_updates=True)
+        logger.info("Telegram бот готов к работе")
+    except Exception as e:
+        logger.error("❌ Ошибка запуска Telegram: %s", e)
     
-    # Запускаем сканер
+    # Загружаем и фильтруем символы. Со свежим кэшем сканер стартует сразу,
+    # а полная фильтрация идёт в фоне
+    if load_cached_symbols():
+        symbols_refresh_task = asyncio.create_task(load_and_filter_symbols())
+    else:
+        await load_and_filter_symbols()
+    
+    # Запускаем отправку алертов и сканер
+    alert_sender_task = asyncio.create_task(alert_sender())
     scanner_task = asyncio.create_task(volume_spike_scanner())
     logger.info("✅ 5-минутный сканер запущен")
     
-    # Запускаем Telegram polling
-    asyncio.create_task(run_telegram_polling())
+    # Запускаем поток текущих свечей
+    kline_stream_task = asyncio.create_task(kline_stream())
     
     yield
     
     logger.info("=== Остановка приложения ===")
     
-    if scanner_task:
-        scanner_task.cancel()
-        try:
-            await scanner_task
-        except asyncio.CancelledError:
-            pass
+    tasks = [task for task in (scanner_task, kline_stream_task, alert_sender_task, symbols_refresh_task) if task]
+    for task in tasks:
+        task.cancel()
     
-    if application:
-        await application.shutdown()
-        await application.stop()
+    # Задачи и Telegram останавливаются параллельно; CancelledError и ошибки собирает gather
+    await asyncio.gather(*tasks, stop_telegram(), return_exceptions=True)
+    
+    # Сессия закрывается последней - ею пользуются остановленные выше задачи
+    if http_session:
+        await http_session.close()
 
 
 # ====================== FASTAPI ======================
 app = FastAPI(lifespan=lifespan)
 
+# Метка времени для "/" с точностью до секунды: (секунда, iso-строка)
+_iso_cache = (0, "")
+
+
+def cached_isoformat() -> str:
+    """ISO-время, пересчитывается не чаще раза в секунду"""
+    global _iso_cache
+    now_i = int(time.time())
+    if now_i != _iso_cache[0]:
+        _iso_cache = (now_i, datetime.fromtimestamp(now_i).isoformat())
+    return _iso_cache[1]
+
+
 @app.get("/")
 async def root():
+    expire_sent_alerts()
     return {
         "service": "MEXC 5-MIN Volume Scanner",
         "status": "active",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": cached_isoformat(),
         "tracked_pairs": len(tracked_symbols),
         "blacklist_count": len(blacklist),
         "paused_count": len(paused_alerts),
-        "recent_alerts": len([v for v in sent_alerts.values() if time.time() - v < 7200])
+        "recent_alerts": len(sent_alerts)
     }
 
 @app.get("/health")
@@ -1393,12 +1709,14 @@ async def health():
 # ====================== ЗАПУСК ======================
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))
-    logger.info(f"Запуск сервера на порту {port}")
+    logger.info("Запуск сервера на порту %s", port)
     
     uvicorn.run(
         app,
         host="0.0.0.0",
         port=port,
+        loop="uvloop",
+        http="httptools",
         reload=False
     )
 
@@ -0,0 +1,68 @@
+import asyncio
+
+import Mexcnewbot as bot
+
+
+def run_scanner_passes(monkeypatch, passes, fetch, scanned=None):
+    """Прогоняет volume_spike_scanner заданное число итераций с подменённой сетью"""
+    done = 0
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay):
+        nonlocal done
+        done += 1
+        if done >= passes:
+            raise asyncio.CancelledError
+        await real_sleep(0)
+
+    async def fake_tickers():
+        return {"XUSDT": (50000.0, 1.0)}
+
+    monkeypatch.setattr(bot, "tracked_symbols", {"XUSDT"})
+    monkeypatch.setattr(bot, "paused_alerts", set())
+    monkeypatch.setattr(bot, "scanned_volumes", scanned if scanned is not None else {})
+    monkeypatch.setattr(bot, "get_all_tickers", fake_tickers)
+    monkeypatch.setattr(bot, "fetch_scan_data", fetch)
+    monkeypatch.setattr(bot.asyncio, "sleep", fake_sleep)
+    asyncio.run(bot.volume_spike_scanner())
+
+
+def test_failed_fetch_is_retried_on_next_pass(monkeypatch):
+    calls = []
+
+    async def fetch(symbol):
+        calls.append(symbol)
+        if len(calls) == 1:
+            return None  # первый запрос свечей не удался
+        # Свечи без всплеска: пара оценена успешно, алерта нет
+        return {"prev_volume": 5000, "curr_volume": 100, "prev_price": 1.0, "curr_price": 1.0}
+
+    run_scanner_passes(monkeypatch, 4, fetch)
+
+    # Проход 1 - ошибка, проход 2 - повтор при том же объёме 24ч,
+    # проход 3 - подтверждающий скан, проход 4 - пропуск
+    assert calls == ["XUSDT", "XUSDT", "XUSDT"]
+    assert bot.scanned_volumes == {"XUSDT": (50000.0, 50000.0)}
+
+
+def test_volume_change_is_scanned_twice(monkeypatch):
+    """Свечи могут отставать от тикера - после сделки пара сканируется ещё раз"""
+    calls = []
+
+    async def fetch(symbol):
+        calls.append(symbol)
+        return {"prev_volume": 5000, "curr_volume": 100, "prev_price": 1.0, "curr_price": 1.0}
+
+    # Последний подтверждённый объём 40000, тикер уже показывает 50000
+    run_scanner_passes(monkeypatch, 3, fetch, scanned={"XUSDT": (40000.0, 40000.0)})
+
+    assert calls == ["XUSDT", "XUSDT"]
+    assert bot.scanned_volumes == {"XUSDT": (50000.0, 50000.0)}
+
+
+def test_select_scan_symbols_skips_unchanged_volume(monkeypatch):
+    monkeypatch.setattr(bot, "scanned_volumes", {"AUSDT": (50000.0, 50000.0), "BUSDT": (None, 60000.0)})
+    tickers = {"AUSDT": (50000.0, 1.0), "BUSDT": (60000.0, 1.0), "CUSDT": (10.0, 1.0)}
+
+    assert bot.select_scan_symbols(["AUSDT", "BUSDT", "CUSDT", "DUSDT"], tickers) == ["BUSDT", "DUSDT"]
+    assert bot.select_scan_symbols(["AUSDT"], None) == ["AUSDT"]